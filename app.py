@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional, Tuple
 import pandas as pd
 import streamlit as st
 from crewai import CrewOutput
@@ -6,6 +6,7 @@ from dotenv import load_dotenv
 from datetime import datetime, date
 import json
 import logging
+import threading
 
 # Configure logging
 logging.basicConfig(
@@ -79,16 +80,68 @@ class StockMarketAnalyzer:
             st.session_state.morning_results = None
         if 'evening_results' not in st.session_state:
             st.session_state.evening_results = None
+        if 'morning_abort_event' not in st.session_state:
+            st.session_state.morning_abort_event = None
 
-    def run_morning_scan(self, market: str, max_recommendations: int):
+    def run_morning_scan(self, market: str, max_recommendations: int, abort_event: threading.Event = None):
         """
-        Run the morning stock market analysis scan.
+        Run the morning stock market analysis scan and stream its progress events.
         :param market:
         :param max_recommendations:
-        :return:
+        :param abort_event: set to stop the scan early
+        :return: iterator of CrewProgressEvent
         """
-        # Placeholder implementation - replace with actual analysis logic
-        return self.crewAiAgentsConfig.run_stock_analysis(market, max_recommendations)
+        return self.crewAiAgentsConfig.stream_stock_analysis(market, max_recommendations, abort_event)
+
+    def render_morning_scan(self, market: str, max_recommendations: int) -> Tuple[List[dict], Optional[str]]:
+        """
+        Run the morning scan and render its progress and recommendations incrementally.
+        Any widget interaction reruns the script and abandons this loop; the scan is then aborted, because a
+        rerun cannot re-attach to it and its recommendations would never be shown.
+        :param market:
+        :param max_recommendations:
+        :return: recommendation rows received before the run ended and the final state of the run,
+                 one of crew_finished, aborted or error
+        """
+        abort_event = threading.Event()
+        st.session_state.morning_abort_event = abort_event
+        rows = []
+        tokens = ""
+        outcome = None
+        started = datetime.now()
+        with st.status("Running Stock Analysis...", expanded=True) as status:
+            st.caption("Changing any input while the scan runs stops it.")
+            table_placeholder = st.empty()
+            token_placeholder = st.empty()
+            try:
+                for event in self.run_morning_scan(market, max_recommendations, abort_event):
+                    if event.event_type == "heartbeat":
+                        # updating an element lets Streamlit stop this loop promptly when a rerun was requested
+                        status.update(label=f"Running Stock Analysis... {(datetime.now() - started).seconds}s")
+                    elif event.event_type == "recommendation":
+                        rows.append(event.payload)
+                        table_placeholder.dataframe(pd.DataFrame(rows))
+                    elif event.event_type == "llm_chunk":
+                        tokens = (tokens + event.message)[-500:]
+                        token_placeholder.caption(tokens)
+                    elif event.event_type in ("task_started", "task_finished", "tool_call", "research_cache"):
+                        st.write(f"{event.timestamp.strftime('%H:%M:%S')} - {event.message}")
+                    elif event.event_type == "aborted":
+                        outcome = event.event_type
+                        status.update(label="Stock Analysis aborted", state="error", expanded=False)
+                    elif event.event_type == "error":
+                        outcome = event.event_type
+                        st.error(event.message)
+                        status.update(label="Stock Analysis failed", state="error", expanded=True)
+                    elif event.event_type == "crew_finished":
+                        outcome = event.event_type
+                        status.update(label="Stock Analysis completed", state="complete", expanded=False)
+            finally:
+                if outcome is None:
+                    # the loop was abandoned by a rerun, stop the crew instead of letting it run unobserved
+                    abort_event.set()
+        st.session_state.morning_abort_event = None
+        return rows, outcome
 
     def list_recommendation_dates(self) -> List[datetime]:
         """
@@ -121,6 +174,33 @@ class StockMarketAnalyzer:
         return response
 
 
+    def get_performance_summary(self, market: str = None) -> pd.DataFrame:
+        """
+        Read per market and day performance of past recommendations from the rollup table.
+        :param market: market to filter on, None for all markets
+        :return:
+        """
+        rollups = self.database_manager.list_performance_rollups(market=market)
+        return pd.DataFrame(rollups)
+
+    def render_performance_summary(self, market: str = None):
+        st.markdown("### 📈 Performance Summary")
+        df = self.get_performance_summary(market)
+        if df.empty:
+            st.info("No performance data available yet")
+            return
+
+        priced = df["priced_count"].sum()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Recommendations", int(df["recommendation_count"].sum()))
+        col2.metric("Hit Daily Target", f"{df['hit_daily_target_count'].sum() / priced:.0%}" if priced else "-")
+        col3.metric("Stopped Out", f"{df['stop_out_count'].sum() / priced:.0%}" if priced else "-")
+        # weight each day's mean return by the number of priced recommendations of that day
+        mean_return = (df["mean_return"].fillna(0) * df["priced_count"]).sum() / priced if priced else None
+        col4.metric("Mean Return", f"{mean_return:.2%}" if mean_return is not None else "-")
+        st.dataframe(df[["analysis_date", "market", "recommendation_count", "priced_count", "hit_daily_target_rate",
+                         "stop_out_rate", "mean_return", "median_return"]])
+
     def main(self):
         st.title("Stock Market Analysis with CrewAI")
         st.markdown("Leverage the power of CrewAI agents to analyze stock market trends and make informed investment decisions.")
@@ -132,25 +212,47 @@ class StockMarketAnalyzer:
             market = st.selectbox("Select Market", ["Sweden", "USA"], key="morning_market", accept_new_options=True)
             max_recs = st.number_input("Max Recommendations", min_value=1, max_value=20, value=5, key="morning_max_recs")
             run_morning = st.button("Run Morning Scan", type="primary", key="morning_scan_button", use_container_width=True)
+            abort_morning = st.button("Abort Morning Scan", key="morning_abort_button", use_container_width=True)
 
             st.subheader("Evening Scan")
             dates = self.list_recommendation_dates()
             review_date = st.selectbox("Select Review Date", options=dates if dates else [datetime.utcnow().date()], key="evening_review_date")
             run_evening = st.button("Run Evening Review", type="primary", key="evening_review_button", use_container_width=True)
 
+            st.subheader("Performance Summary")
+            summary_market = st.selectbox("Select Market", ["All", "Sweden", "USA"], key="summary_market", accept_new_options=True)
+            show_summary = st.checkbox("Show Performance Summary", key="show_summary")
+
+
+        # clicking any button reruns the script, which already aborts a running scan; the abort event stops the
+        # crew at its next agent step
+        if abort_morning and st.session_state.morning_abort_event is not None:
+            st.session_state.morning_abort_event.set()
+            st.session_state.morning_abort_event = None
+            st.warning("Morning scan aborted")
 
         if 'run_morning' not in locals():
             run_morning = False
         if run_morning:
             st.session_state.morning_results = None
-            with st.spinner("Running Stock Analysis..."):
-                response = self.run_morning_scan(market, max_recs)
-                st.session_state.morning_results = "Analysis Completed"
+            rows, outcome = self.render_morning_scan(market, max_recs)
+            if outcome == "crew_finished":
+                st.session_state.morning_results = rows if rows else "Analysis Completed"
+            else:
+                # aborted or failed runs stored nothing, so there is nothing to read back from the database
+                st.warning(f"Morning scan {'aborted' if outcome == 'aborted' else 'failed'}, no recommendations stored")
 
         # create empty dataframe
         df = pd.DataFrame()
 
-        if st.session_state.morning_results:
+        if isinstance(st.session_state.morning_results, list):
+            # recommendations were streamed from the analysis task, no need to query them back from the database
+            st.markdown("### ✅ Morning Recommendations")
+            df = pd.DataFrame(st.session_state.morning_results)
+            columns = ["stock_name", "stock_code", "market", "buy_price", "target_price_daily", "target_price_weekly",
+                       "stop_loss", "analysis_date", "analysis"]
+            st.dataframe(df[[column for column in columns if column in df.columns]])
+        elif st.session_state.morning_results:
             st.markdown("### ✅ Morning Recommendations")
             query = "Fetch all rows and columns except day_end_price from stock_market_analysis_data table based on today's date"
             response = self.list_stock_data_analysis(query)
@@ -226,6 +328,9 @@ class StockMarketAnalyzer:
 
             st.dataframe(df)
 
+        if show_summary:
+            self.render_performance_summary(None if summary_market == "All" else summary_market)
+
 
 
 if __name__ == '__main__':
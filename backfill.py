@@ -0,0 +1,256 @@
+import argparse
+import csv
+import hashlib
+import importlib
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from database_manager import DatabaseClient, StockMarketAnalysisData
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_FILE = "backfill_checkpoint.json"
+
+# (analysis_date, market, stock_code) identifies one closing price to fetch
+PriceKey = Tuple[date, str, str]
+
+
+class PriceSource(ABC):
+    """
+    Source of historical closing prices. Subclass and pass `--source module:Class` to plug in another provider.
+    """
+
+    @property
+    def name(self) -> str:
+        """
+        Identity of the source in the checkpoint. Prices a source did not have are only skipped on later runs
+        with the same name, so override it when the data behind a source can change.
+        """
+        return f"{type(self).__module__}:{type(self).__qualname__}"
+
+    @abstractmethod
+    def get_closing_price(self, stock_code: str, market: str, trade_date: date) -> Optional[float]:
+        """
+        :return: closing price of the stock on the given date, None if it is not available
+        """
+
+
+class FilePriceSource(PriceSource):
+    """
+    Offline price source reading a CSV file with stock_code, date and close columns (market is optional).
+    """
+
+    def __init__(self, path: str):
+        self.prices: Dict[Tuple[str, str, str], float] = {}
+        with open(path, "rb") as f:
+            # a changed file is a new source, so prices it lacked before are retried
+            self._name = f"file:{os.path.abspath(path)}:{hashlib.sha1(f.read()).hexdigest()}"
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                close = row.get("close") or row.get("day_end_price")
+                if close in (None, ""):
+                    continue
+                self.prices[(row.get("market") or "", row["stock_code"], row["date"])] = float(close)
+        logger.info(f"Loaded {len(self.prices)} closing prices from {path}")
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def get_closing_price(self, stock_code: str, market: str, trade_date: date) -> Optional[float]:
+        day = trade_date.isoformat()
+        price = self.prices.get((market, stock_code, day))
+        return price if price is not None else self.prices.get(("", stock_code, day))
+
+
+class RateLimitedPriceSource(PriceSource):
+    """
+    Wraps a price source so that at most `rate` requests per second are made across all worker threads.
+    """
+
+    def __init__(self, source: PriceSource, rate: float):
+        self.source = source
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self.source.name
+
+    def get_closing_price(self, stock_code: str, market: str, trade_date: date) -> Optional[float]:
+        if self.interval:
+            with self._lock:
+                now = time.monotonic()
+                slot = max(self._next_slot, now)
+                self._next_slot = slot + self.interval
+            time.sleep(max(0.0, slot - now))
+        return self.source.get_closing_price(stock_code, market, trade_date)
+
+
+def load_price_source(source: str) -> PriceSource:
+    """
+    Build a price source from a CSV file path or a `module:Class` reference to a PriceSource subclass.
+    :param source:
+    :return:
+    """
+    if os.path.isfile(source):
+        return FilePriceSource(source)
+    module_name, _, class_name = source.partition(":")
+    if not class_name:
+        raise ValueError(f"Price source '{source}' is neither a file nor a module:Class reference")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+class Checkpoint:
+    """
+    Remembers, per price source, which prices the source did not have, so resumed runs do not ask it again.
+    Written prices need no checkpoint: they no longer have a NULL day_end_price. A different source starts
+    with an empty list and retries everything.
+    """
+
+    def __init__(self, path: str, source_name: str):
+        self.path = path
+        self.source_name = source_name
+        self.sources: Dict[str, List[List[str]]] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.sources = json.load(f)
+        self.missing = {tuple(key) for key in self.sources.get(source_name, [])}
+        if self.missing:
+            logger.info(f"Checkpoint {path} has {len(self.missing)} prices {source_name} did not have")
+
+    @staticmethod
+    def key(price_key: PriceKey) -> Tuple[str, str, str]:
+        analysis_date, market, stock_code = price_key
+        return analysis_date.isoformat(), market, stock_code
+
+    def __contains__(self, price_key: PriceKey) -> bool:
+        return self.key(price_key) in self.missing
+
+    def add_missing(self, price_keys: List[PriceKey]):
+        if not price_keys:
+            return
+        self.missing.update(self.key(price_key) for price_key in price_keys)
+        self.sources[self.source_name] = sorted(self.missing)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.sources, f)
+        os.replace(tmp_path, self.path)
+
+
+def find_missing_prices(database_client: DatabaseClient, start_date: date, end_date: date,
+                        markets: Optional[List[str]] = None) -> List[PriceKey]:
+    """
+    Find recommendations without day_end_price in the date range, grouped by date, market and ticker.
+    :return: sorted distinct (analysis_date, market, stock_code) keys
+    """
+    table = StockMarketAnalysisData
+    query = (select(table.analysis_date, table.market, table.stock_code).distinct()
+             .where(table.day_end_price.is_(None), table.analysis_date >= start_date, table.analysis_date <= end_date))
+    if markets:
+        query = query.where(table.market.in_(markets))
+    with database_client.engine.connect() as connection:
+        return sorted(tuple(row) for row in connection.execute(query))
+
+
+def backfill(database_client: DatabaseClient, source: PriceSource, start_date: date, end_date: date,
+             markets: Optional[List[str]] = None, workers: int = 8, batch_size: int = 200,
+             checkpoint_path: str = DEFAULT_CHECKPOINT_FILE, retry_missing: bool = False) -> dict:
+    """
+    Fetch missing closing prices concurrently and write them back in batches.
+    Prices this source did not have in an earlier run are skipped unless `retry_missing` is set.
+    :return: stats of the run
+    """
+    checkpoint = Checkpoint(checkpoint_path, source.name)
+    candidates = find_missing_prices(database_client, start_date, end_date, markets)
+    pending = candidates if retry_missing else [key for key in candidates if key not in checkpoint]
+    skipped = len(candidates) - len(pending)
+    if skipped:
+        logger.info(f"Skipping {skipped} prices {source.name} did not have in an earlier run, "
+                    f"use --retry-missing to ask for them again")
+    stats = {"pending": len(pending), "skipped": skipped, "fetched": 0, "missing": 0, "failed": 0, "updated": 0}
+    logger.info(f"Backfilling {len(pending)} closing prices from {start_date} to {end_date} with {workers} workers")
+    if not pending:
+        return stats
+
+    started = time.perf_counter()
+    batch: List[dict] = []
+    missing_keys: List[PriceKey] = []
+
+    def flush():
+        if batch:
+            stats["updated"] += database_client.update_day_end_prices(batch)
+        checkpoint.add_missing(missing_keys)
+        batch.clear()
+        missing_keys.clear()
+
+    def fetch(key: PriceKey) -> Optional[float]:
+        analysis_date, market, stock_code = key
+        return source.get_closing_price(stock_code, market, analysis_date)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(fetch, key): key for key in pending}
+        for completed, future in enumerate(as_completed(futures), start=1):
+            key = futures[future]
+            analysis_date, market, stock_code = key
+            try:
+                price = future.result()
+            except Exception as e:
+                # failed fetches are not checkpointed so the next run retries them
+                logger.warning(f"Failed to fetch closing price of {stock_code} on {analysis_date}: {e}")
+                stats["failed"] += 1
+                continue
+            if price is None:
+                stats["missing"] += 1
+                missing_keys.append(key)
+            else:
+                stats["fetched"] += 1
+                batch.append({"stock_code": stock_code, "market": market, "analysis_date": analysis_date,
+                              "day_end_price": price})
+
+            if len(batch) + len(missing_keys) >= batch_size or completed == len(pending):
+                flush()
+                elapsed = time.perf_counter() - started
+                logger.info(f"Progress {completed}/{len(pending)} prices, {completed / elapsed:.1f} prices/s, "
+                            f"{stats['updated']} recommendations updated")
+    flush()
+
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Backfill missing day_end_price values for past recommendations")
+    parser.add_argument("--start", required=True, type=date.fromisoformat, help="first analysis date, YYYY-MM-DD")
+    parser.add_argument("--end", required=True, type=date.fromisoformat, help="last analysis date, YYYY-MM-DD")
+    parser.add_argument("--markets", nargs="*", default=None, help="markets to backfill, all when omitted")
+    parser.add_argument("--source", required=True, help="CSV file with stock_code,date,close or module:Class")
+    parser.add_argument("--rate", type=float, default=0, help="max price requests per second, 0 for unlimited")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_FILE)
+    parser.add_argument("--retry-missing", action="store_true",
+                        help="ask the source again for prices it did not have in an earlier run")
+    args = parser.parse_args()
+
+    price_source = load_price_source(args.source)
+    if args.rate > 0:
+        price_source = RateLimitedPriceSource(price_source, args.rate)
+    result = backfill(DatabaseClient(), price_source, args.start, args.end, args.markets, args.workers,
+                      args.batch_size, args.checkpoint, args.retry_missing)
+    print(json.dumps(result, indent=2))
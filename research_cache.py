@@ -0,0 +1,111 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from database_manager import DatabaseClient
+from stock_models import ResearchCacheStats
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# cached research of a ticker is reused by morning scans for this long
+research_cache_max_age = timedelta(hours=24)
+
+
+class ResearchCachePlan:
+    """
+    Split of one market's cached research into fresh and stale tickers for a single morning scan, and the
+    reused/refreshed/new statistics of that scan.
+    """
+
+    def __init__(self, market: str, fresh: List[dict], stale: List[dict]):
+        self.market = market
+        self.fresh = fresh
+        self.stale_tickers: Set[str] = {entry["stock_code"] for entry in stale}
+        self.stats = ResearchCacheStats(market=market, reused=[entry["stock_code"] for entry in fresh])
+        # the research task callback and the cache tool may update the stats from different threads
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, database_client: DatabaseClient, market: str, max_age: timedelta = research_cache_max_age,
+              now: Optional[datetime] = None) -> "ResearchCachePlan":
+        """
+        Read the cached research of a market and split it by freshness.
+        :param database_client:
+        :param market:
+        :param max_age: research older than this is stale
+        :param now: reference time, defaults to utcnow
+        :return:
+        """
+        cutoff = (now or datetime.utcnow()) - max_age
+        entries = database_client.list_research_findings(market)
+        plan = cls(market,
+                   fresh=[entry for entry in entries if entry["researched_at"] >= cutoff],
+                   stale=[entry for entry in entries if entry["researched_at"] < cutoff])
+        logger.info(f"Research cache for {market}: {len(plan.fresh)} fresh, {len(plan.stale_tickers)} stale tickers")
+        return plan
+
+    def inputs(self) -> dict:
+        """
+        :return: `cached_research` and `stale_tickers` inputs for the research and analysis tasks
+        """
+        cached_research = "\n".join(
+            f"- {entry['stock_name']} ({entry['stock_code']}), researched {entry['researched_at']:%Y-%m-%d %H:%M}: "
+            f"{entry['summary']}" for entry in self.fresh)
+        return {
+            "cached_research": cached_research or "None",
+            "stale_tickers": ", ".join(sorted(self.stale_tickers)) or "None"
+        }
+
+    def report(self) -> str:
+        return (f"Research cache for {self.market}: reused {len(self.stats.reused)}, "
+                f"refreshed {len(self.stats.refreshed)}, new {len(self.stats.new)} tickers")
+
+
+def cache_research_findings(database_client: DatabaseClient, findings: List[dict],
+                            plan: Optional[ResearchCachePlan] = None,
+                            max_age: timedelta = research_cache_max_age) -> int:
+    """
+    Cache per ticker research findings from the research task or the research cache tool.
+    Within a morning scan the findings are assigned to the scan's market, tickers the scan reused keep their
+    original freshness timestamp and the scan's statistics are updated. Outside a scan, tickers whose cached
+    research is still fresh are left untouched.
+    :param database_client:
+    :param findings: dicts with stock_code, market, summary and optionally stock_name and sources
+    :param plan: plan of the running scan, bound to the research task callback and cache tool of that scan
+    :param max_age: freshness used outside a scan
+    :return: number of tickers written
+    """
+    if plan is not None:
+        findings = [dict(finding, market=plan.market) for finding in findings
+                    if finding.get("stock_code") not in plan.stats.reused]
+    else:
+        cutoff = datetime.utcnow() - max_age
+        fresh_by_market: Dict[str, Set[str]] = {}
+        kept = []
+        for finding in findings:
+            market = finding.get("market")
+            if market not in fresh_by_market:
+                entries = database_client.list_research_findings(market) if market else []
+                fresh_by_market[market] = {entry["stock_code"] for entry in entries if entry["researched_at"] >= cutoff}
+            if finding.get("stock_code") not in fresh_by_market[market]:
+                kept.append(finding)
+        findings = kept
+
+    written = database_client.upsert_research_findings(findings) if findings else 0
+    if plan is not None:
+        with plan._lock:
+            for finding in findings:
+                stock_code = finding.get("stock_code")
+                if not stock_code or not finding.get("summary") or stock_code in plan.stats.refreshed + plan.stats.new:
+                    continue
+                if stock_code in plan.stale_tickers:
+                    plan.stats.refreshed.append(stock_code)
+                else:
+                    plan.stats.new.append(stock_code)
+    return written
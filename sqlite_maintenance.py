@@ -0,0 +1,198 @@
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+from database_manager import (Base, StockMarketAnalysisData, SQLiteWriteQueue, create_sqlite_engine, init_schema,
+                              refresh_performance_rollups, sqlite_connection_string)
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+COPY_BATCH_SIZE = 1000
+
+
+def migrate(url: str = sqlite_connection_string, source_url: str = None) -> int:
+    """
+    Bring an existing SQLite database up to the embedded mode: switch it to WAL, create missing tables and
+    indexes and optionally copy rows that are not yet present from another database (e.g. PostgreSQL).
+    Performance rollups are refreshed for the copied rows.
+    :param url: sqlite connection string to migrate
+    :param source_url: optional database to copy stock analysis rows from
+    :return: number of rows copied
+    """
+    engine = create_sqlite_engine(url)
+    init_schema(engine)
+    with engine.connect() as connection:
+        journal_mode = connection.execute(text("PRAGMA journal_mode")).scalar()
+    logger.info(f"SQLite database {url} uses journal_mode={journal_mode}")
+
+    copied = 0
+    if source_url:
+        source_engine = create_engine(source_url)
+        table = StockMarketAnalysisData.__table__
+        with engine.connect() as connection:
+            existing = {(row.stock_name, row.analysis_date)
+                        for row in connection.execute(select(table.c.stock_name, table.c.analysis_date))}
+        groups = set()
+        with source_engine.connect() as source, Session(engine) as target:
+            result = source.execution_options(yield_per=COPY_BATCH_SIZE).execute(select(table))
+            for batch in result.mappings().partitions(COPY_BATCH_SIZE):
+                rows = [dict(row) for row in batch if (row["stock_name"], row["analysis_date"]) not in existing]
+                if rows:
+                    target.execute(table.insert(), rows)
+                    groups.update((row["market"], row["analysis_date"]) for row in rows)
+                    copied += len(rows)
+            refresh_performance_rollups(target, groups)
+            target.commit()
+        logger.info(f"Copied {copied} rows from {source_url} and refreshed {len(groups)} performance rollups")
+    engine.dispose()
+    return copied
+
+
+def vacuum(url: str = sqlite_connection_string):
+    """
+    Checkpoint and truncate the WAL file, rebuild the database file and refresh planner statistics.
+    :param url: sqlite connection string
+    :return:
+    """
+    engine = create_sqlite_engine(url)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        busy, wal_pages, checkpointed = connection.execute(text("PRAGMA wal_checkpoint(TRUNCATE)")).one()
+        logger.info(f"WAL checkpoint: busy={busy} wal_pages={wal_pages} checkpointed={checkpointed}")
+        connection.execute(text("VACUUM"))
+        connection.execute(text("ANALYZE"))
+        connection.execute(text("PRAGMA optimize"))
+    engine.dispose()
+    logger.info(f"Vacuumed SQLite database {url}")
+
+
+def _benchmark_rows(writer: int, batch: int, batch_size: int):
+    start = date(2000, 1, 1)
+    for i in range(batch_size):
+        yield StockMarketAnalysisData(stock_name=f"stock-{writer}-{batch}-{i}", stock_code=f"S{writer}{i}",
+                                      market="Sweden" if i % 2 else "USA", buy_price=100.0,
+                                      target_price_daily=101.0, target_price_weekly=105.0, stop_loss=95.0,
+                                      analysis_date=start + timedelta(days=batch))
+
+
+def _run_benchmark(url: str, tuned: bool, writers: int, readers: int, batches: int, batch_size: int) -> dict:
+    engine = create_sqlite_engine(url) if tuned else create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    write_queue = SQLiteWriteQueue(engine) if tuned else None
+    stats = {"writes": 0, "reads": 0, "write_errors": 0, "read_errors": 0}
+    lock = threading.Lock()
+    writers_done = threading.Event()
+
+    def write_batch(rows):
+        if write_queue is not None:
+            write_queue.submit(lambda session: session.add_all(rows)).result()
+            return
+        session = SessionLocal()
+        try:
+            session.add_all(rows)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def writer(index: int):
+        for batch in range(batches):
+            try:
+                write_batch(list(_benchmark_rows(index, batch, batch_size)))
+                key = "writes"
+            except OperationalError:
+                key = "write_errors"
+            with lock:
+                stats[key] += 1
+
+    def reader():
+        query = text("select market, count(*), avg(buy_price) from stock_market_data_analysis "
+                     "where analysis_date >= :start group by market")
+        while not writers_done.is_set():
+            try:
+                with engine.connect() as connection:
+                    connection.execute(query, {"start": date(2000, 1, 1)}).fetchall()
+                key = "reads"
+            except OperationalError:
+                key = "read_errors"
+            with lock:
+                stats[key] += 1
+
+    reader_threads = [threading.Thread(target=reader) for _ in range(readers)]
+    writer_threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    started = time.perf_counter()
+    for thread in reader_threads + writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    writers_done.set()
+    for thread in reader_threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    if write_queue is not None:
+        write_queue.close()
+    engine.dispose()
+    stats["seconds"] = elapsed
+    stats["write_batches_per_second"] = stats["writes"] / elapsed
+    stats["reads_per_second"] = stats["reads"] / elapsed
+    return stats
+
+
+def benchmark(writers: int = 4, readers: int = 4, batches: int = 50, batch_size: int = 20) -> dict:
+    """
+    Compare concurrent read and write throughput of the default SQLite settings with the embedded mode.
+    :return: stats per mode
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in ("default", "tuned"):
+            url = f"sqlite:///{os.path.join(directory, f'{mode}.db')}"
+            results[mode] = _run_benchmark(url, mode == "tuned", writers, readers, batches, batch_size)
+            logger.info(f"{mode}: {results[mode]}")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Maintenance utilities for the embedded SQLite database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser("migrate", help="switch to WAL, create schema, optionally copy rows")
+    migrate_parser.add_argument("--url", default=sqlite_connection_string)
+    migrate_parser.add_argument("--source", default=None, help="database URL to copy stock analysis rows from")
+
+    vacuum_parser = subparsers.add_parser("vacuum", help="checkpoint WAL, vacuum and analyze")
+    vacuum_parser.add_argument("--url", default=sqlite_connection_string)
+
+    benchmark_parser = subparsers.add_parser("benchmark", help="compare default and tuned settings under load")
+    benchmark_parser.add_argument("--writers", type=int, default=4)
+    benchmark_parser.add_argument("--readers", type=int, default=4)
+    benchmark_parser.add_argument("--batches", type=int, default=50)
+    benchmark_parser.add_argument("--batch-size", type=int, default=20)
+
+    args = parser.parse_args()
+    if args.command == "migrate":
+        migrate(args.url, args.source)
+    elif args.command == "vacuum":
+        vacuum(args.url)
+    else:
+        results = benchmark(args.writers, args.readers, args.batches, args.batch_size)
+        for mode, stats in results.items():
+            print(f"{mode:8s} write batches/s={stats['write_batches_per_second']:.1f} "
+                  f"reads/s={stats['reads_per_second']:.1f} write_errors={stats['write_errors']} "
+                  f"read_errors={stats['read_errors']}")
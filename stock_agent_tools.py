@@ -1,7 +1,9 @@
-from typing import List
+from typing import List, Optional
 
-from database_manager import DatabaseClient, StockMarketAnalysisData
-from stock_models import StockAnalysisDataList
+from database_manager import DatabaseClient, StockMarketAnalysisData, notify_data_written, get_sqlite_engine, \
+    sqlite_connection_string, refresh_performance_rollups
+from stock_models import StockAnalysisDataList, StockClosingPriceList, StockResearchFindingList
+from research_cache import ResearchCachePlan, cache_research_findings
 
 try:
     from crewai.tools import tool
@@ -32,8 +34,9 @@ try:
     db = SQLDatabase.from_uri(connection_string)
 except Exception as e:
     logger.warning(f"Failed to initialize Postgres SQLDatabase, falling back to local SQLite. Error: {e}")
-    connection_string = "sqlite:///local_stock_data.db"
-    db = SQLDatabase.from_uri(connection_string)
+    connection_string = sqlite_connection_string
+    # share the tuned embedded engine (WAL, busy timeout) with DatabaseClient
+    db = SQLDatabase(get_sqlite_engine(connection_string))
 
 database_client = DatabaseClient()
 
@@ -47,7 +50,6 @@ def store_stock_data(stock_analysis_data: StockAnalysisDataList) -> bool:
     :return:
     """
     try:
-        session = database_client.SessionLocal()
         logger.info(f"type of stock_analysis_data is {type(stock_analysis_data)}")
         logger.info(f"Received stock analysis data to store: {stock_analysis_data}")
 
@@ -62,7 +64,7 @@ def store_stock_data(stock_analysis_data: StockAnalysisDataList) -> bool:
         else:
             items = [payload]
 
-        saved = 0
+        rows = []
         for item in items:
             # Convert pydantic objects to dicts if needed
             if hasattr(item, "model_dump"):
@@ -86,21 +88,98 @@ def store_stock_data(stock_analysis_data: StockAnalysisDataList) -> bool:
                 stop_loss=data.get("stop_loss"),
                 analysis_date=data.get("analysis_date_time")
             )
-            session.add(stock_data)
-            saved += 1
+            rows.append(stock_data)
 
-        session.commit()
-        logger.info(f"Stored {saved} stock analysis rows successfully.")
+        def work(session):
+            session.add_all(rows)
+            session.flush()
+            refresh_performance_rollups(session, [(row.market, row.analysis_date) for row in rows])
+
+        database_client.write(work)
+        logger.info(f"Stored {len(rows)} stock analysis rows successfully.")
+        notify_data_written()
         return True
     except Exception as e:
-        session.rollback()
         logger.error(f"Failed to store stock data: {e}")
         return False
-    finally:
-        session.close()
 
 
 
+@tool("StockClosingPriceStorageTool")
+def store_closing_prices(closing_prices: StockClosingPriceList) -> str:
+    """
+    Tool to store the closing prices (day_end_price) of already recommended stocks into the database.
+    Use this tool instead of UPDATE statements so performance summaries stay up to date.
+    Prices are matched on stock code and analysis date.
+    :param closing_prices: List of stock closing prices with stock name, stock code, day end price and analysis date
+    :return: number of recommendations updated, or an error when no recommendation matched
+    """
+    try:
+        payload = closing_prices
+        if hasattr(payload, "closing_prices"):
+            items = payload.closing_prices
+        elif isinstance(payload, dict) and "closing_prices" in payload:
+            items = payload["closing_prices"]
+        elif isinstance(payload, list):
+            items = payload
+        else:
+            items = [payload]
+
+        prices = [item.model_dump() if hasattr(item, "model_dump") else item for item in items]
+        prices = [price for price in prices if isinstance(price, dict)]
+        updated = database_client.update_day_end_prices(prices)
+        if updated == 0:
+            logger.error(f"No recommendations matched the closing prices: {prices}")
+            return ("Error storing closing prices: no recommendation matched the given stock codes and analysis dates."
+                    " Check the stock codes and dates against the stock_market_data_analysis table.")
+        logger.info(f"Stored closing prices for {updated} of {len(prices)} stocks.")
+        return f"Stored closing prices for {updated} recommendations out of {len(prices)} prices given."
+    except Exception as e:
+        logger.error(f"Failed to store closing prices: {e}")
+        return f"Error storing closing prices: {e}"
+
+
+def make_research_cache_tool(plan: Optional[ResearchCachePlan] = None):
+    """
+    Create the research cache tool bound to the plan of one morning scan, so findings cached by the agent get the
+    scan's market and reused-ticker filter whichever thread crewAI runs the tool in.
+    :param plan: plan of the scan, None for use outside a scan
+    :return:
+    """
+    @tool("StockResearchCacheTool")
+    def store_research_findings(research_findings: StockResearchFindingList) -> bool:
+        """
+        Tool to cache the summarized research of individual tickers so future scans can reuse it.
+        Use this tool after researching a ticker with its summary and the sources used.
+        :param research_findings: List of research findings with stock name, stock code, market, summary and sources
+        :return:
+        """
+        try:
+            payload = research_findings
+            if hasattr(payload, "findings"):
+                items = payload.findings
+            elif isinstance(payload, dict) and "findings" in payload:
+                items = payload["findings"]
+            elif isinstance(payload, list):
+                items = payload
+            else:
+                items = [payload]
+
+            findings = [item.model_dump() if hasattr(item, "model_dump") else item for item in items]
+            # same market override and reused-ticker filter as the research task output
+            cache_research_findings(database_client, [finding for finding in findings if isinstance(finding, dict)],
+                                    plan)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to cache research findings: {e}")
+            return False
+
+    return store_research_findings
+
+
+store_research_findings = make_research_cache_tool()
+
+
 @tool("execute_sql")
 def execute_sql(query: str) -> str:
     """
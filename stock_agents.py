@@ -1,13 +1,19 @@
 from datetime import datetime
 from textwrap import dedent
-from typing import List
+from typing import List, Iterator, Optional, Tuple
+import functools
 import logging
+import os
+import threading
 import pandas as pd
-from crewai import Agent, Task, Crew, CrewOutput
+from crewai import Agent, Task, Crew, CrewOutput, LLM
 from crewai_tools import SerperDevTool
 from load_dotenv import load_dotenv
-from stock_agent_tools import (store_stock_data, execute_sql, list_tables, check_sql, tables_schema)
-from stock_models import StockAnalysisData, StockAnalysisDataList
+from stock_agent_tools import (store_stock_data, store_closing_prices, make_research_cache_tool, execute_sql,
+                               list_tables, check_sql, tables_schema, database_client)
+from stock_models import StockAnalysisData, StockAnalysisDataList, CrewProgressEvent, StockResearchFindingList
+from research_cache import ResearchCachePlan, cache_research_findings
+from stock_progress import CrewProgressStream
 
 
 # Configure logging
@@ -23,10 +29,78 @@ search_tool = SerperDevTool()
 verbose_flag=True
 load_dotenv()
 
+# LLM of the morning scan agents; streaming publishes partial tokens that the scan shows as llm_chunk events
+scan_llm = LLM(model=os.getenv("OPENAI_MODEL_NAME", "gpt-4o-mini"), stream=True)
+
 class CrewAiAgentsConfig:
     def __init__(self):
+        # agents and tasks of the morning scan crew; every run builds its own with _build_stock_crew
+        self.stock_research_agent, self.stock_analysis_agent, self.stock_data_storage_agent = self._create_scan_agents()
+        self.research_task, self.analysis_task, self.storage_task = self._create_scan_tasks(
+            self.stock_research_agent, self.stock_analysis_agent, self.stock_data_storage_agent)
+
+        # create agent to read from database
+        self.sql_query_agent = Agent(
+            role= "SQL Query Agent",
+            goal="Generate and execute SQL queries based on a request from the database",
+            backstory=dedent("""
+                You are an experienced database engineer who is master at creating efficient and complex SQL queries.
+                You have a deep understanding of how different databases work and how to optimize queries.
+                Use the `list_tables` to find available tables.
+                Use the `tables_schema` to understand the metadata for the tables.
+                Use the `execute_sql` to check your queries for correctness.
+                Use the `check_sql` to execute queries against the database.
+            """),
+            tools=[execute_sql, list_tables, check_sql, tables_schema],
+            allow_delegation=False,
+            verbose=verbose_flag,
+            cache=True
+        )
+
+        self.extract_data_task = Task(
+            description="Generate and execute SQL queries to extract relevant stock market analysis data based on the given {query}.",
+            expected_output="List of database query results based on the specified criteria.",
+            agent=self.sql_query_agent,
+            output_pydantic=StockAnalysisDataList
+        )
+
+        # agent to get stock price at end of the day
+        self.stock_closing_price_analysis_agent= Agent(
+            role="Stock Price Agent",
+            goal="Fetch the stock closing price for the date {review_date} for the stock codes fetched from the database",
+            backstory=(" You are an expert in retrieving accurate stock price data."
+                       " Your goal is to fetch stock names or codes from the table 'stock_market_data_analysis' for the date {review_date}"
+                       " and get their closing prices for that date."
+                       " Use search tool to get the stock prices."
+                       " Always use the `StockClosingPriceStorageTool` to store the closing prices with the stock codes"
+                       " read from the database. Never update the database with SQL statements."
+                       " Use the `list_tables` to find available tables."
+                       " Use the `tables_schema` to understand the metadata for the tables."
+                       " Use the `execute_sql` to check your queries for correctness."
+                       " Use the `check_sql` to execute queries against the database."),
+            verbose=verbose_flag,
+            memory=True,
+            allow_delegation=False,
+            tools=[search_tool, store_closing_prices, execute_sql, check_sql, list_tables, tables_schema]
+        )
+
+        self.stock_closing_price_task = Task(
+            description="Retrieve the closing stock prices for the given date {review_date} for all the stock codes fetched from database",
+            expected_output=("Closing prices for each stock code stored with the `StockClosingPriceStorageTool`,"
+                            " which reports how many recommendations were updated."
+                            " Confirmation that closing prices were stored for all stock codes for the given date."),
+            agent=self.stock_closing_price_analysis_agent
+        )
+
+
+    def _create_scan_agents(self, research_plan: Optional[ResearchCachePlan] = None) -> Tuple[Agent, Agent, Agent]:
+        """
+        Create the research, analysis and storage agents of the morning scan.
+        :param research_plan: research cache plan of the scan, bound to the research agent's cache tool
+        :return:
+        """
         # agent for research task
-        self.stock_research_agent = Agent(
+        research_agent = Agent(
             role="Stock Research Agent",
             goal="Research financial markets and get latest stock information for {market} for this current year",
             backstory=("You are a seasoned financial analyst with deep knowledge of stock markets and investment strategies."
@@ -37,21 +111,17 @@ class CrewAiAgentsConfig:
                       " Use the `tables_schema` to understand the metadata for the tables."
                       " Use the `execute_sql` to check your queries for correctness."
                       " Use the `check_sql` to execute queries against the database."
+                      " Use the `StockResearchCacheTool` to cache the summary and sources of each researched ticker."
                        ),
-            tools=[search_tool, execute_sql, list_tables, check_sql, tables_schema],
+            tools=[search_tool, make_research_cache_tool(research_plan), execute_sql, list_tables, check_sql,
+                   tables_schema],
+            llm=scan_llm,
             allow_delegation=True,
             verbose=verbose_flag
         )
 
-        # define tasks for stock research agent
-        self.research_task = Task(
-            description="Conduct in-depth research on the current state of the {market} stock market for this current year",
-            expected_output="Comprehensive latest market data, stock performance metrics, and relevant news articles.",
-            agent=self.stock_research_agent
-        )
-
         # agent for stock analysis task
-        self.stock_analysis_agent = Agent(
+        analysis_agent = Agent(
             role = "Stock Analysis Agent",
             goal = "Analyze stock data and provide investment insights for {market}",
             backstory=(" With a strong background in financial analysis, you excel at interpreting stock data and market trends."
@@ -67,94 +137,90 @@ class CrewAiAgentsConfig:
                        " Use the `check_sql` to execute queries against the database."
                        ),
             tools =[search_tool, execute_sql, list_tables, check_sql, tables_schema],
+            llm=scan_llm,
             allow_delegation=True,
             verbose=verbose_flag,
             memory=True
         )
 
-        # define tasks for stock analysis agent
-        self.analysis_task = Task(
-            description="Analyze the researched stock data and identify top {number} stocks to buy with detailed recommendations.",
-            expected_output=("A list of top {number} stocks along with stock code in the specified {market} to buy with buy price, "
-                             "target price for day and weekly trades, stop loss prices, analysis date time and rationale."
-                             "Analysis date should be the current date when the analysis is performed."
-                             "Analysis date should be in the format of YYYY-MM-DD"
-                             "Output should be in the form of list of StockAnalysisData objects"),
-            agent=self.stock_analysis_agent,
-            output_json=StockAnalysisDataList
-        )
-
-
         # define agent to store indentified stock data
-        self.stock_data_storage_agent = Agent(
+        storage_agent = Agent(
             role="Stock Data Storage Agent",
             goal="Store and manage researched stock data efficiently",
             backstory=(" You are responsible for organizing and maintaining the integrity of stock data generated from the agent stock_analysis_agent"
                        " Your expertise ensures that all researched information is accurately stored and easily accessible."
                        " Expect input in the form of StockAnalysisDataList objects"),
             tools=[store_stock_data],
+            llm=scan_llm,
             verbose=verbose_flag,
             memory=True,
             allow_delegation=False
         )
+        return research_agent, analysis_agent, storage_agent
 
-        # define task for stock_data_storage_agent
-        self.storage_task = Task(
-            description="Store the analyzed stock data into the database for future reference.",
-            expected_output="Confirmation of successful data storage and list of stored stock data.",
-            agent=self.stock_data_storage_agent
-        )
-
-        # create agent to read from database
-        self.sql_query_agent = Agent(
-            role= "SQL Query Agent",
-            goal="Generate and execute SQL queries based on a request from the database",
-            backstory=dedent("""
-                You are an experienced database engineer who is master at creating efficient and complex SQL queries.
-                You have a deep understanding of how different databases work and how to optimize queries.
-                Use the `list_tables` to find available tables.
-                Use the `tables_schema` to understand the metadata for the tables.
-                Use the `execute_sql` to check your queries for correctness.
-                Use the `check_sql` to execute queries against the database.
-            """),
-            tools=[execute_sql, list_tables, check_sql, tables_schema],
-            allow_delegation=False,
-            verbose=verbose_flag,
-            cache=True
-        )
-
-        self.extract_data_task = Task(
-            description="Generate and execute SQL queries to extract relevant stock market analysis data based on the given {query}.",
-            expected_output="List of database query results based on the specified criteria.",
-            agent=self.sql_query_agent,
-            output_pydantic=StockAnalysisDataList
+    def _create_scan_tasks(self, research_agent: Agent, analysis_agent: Agent, storage_agent: Agent,
+                           research_plan: Optional[ResearchCachePlan] = None) -> Tuple[Task, Task, Task]:
+        """
+        Create the research, analysis and storage tasks of the morning scan for the given agents.
+        :param research_agent:
+        :param analysis_agent:
+        :param storage_agent:
+        :param research_plan: research cache plan of the scan, bound to the research task callback
+        :return:
+        """
+        # define tasks for stock research agent
+        research_task = Task(
+            description=("Conduct in-depth research on the current state of the {market} stock market for this current year."
+                         " These tickers were researched recently and are still fresh. Reuse their summaries and do not research them again:"
+                         "\n{cached_research}\n"
+                         "These tickers have stale research and must be researched again: {stale_tickers}."
+                         " Only research stale tickers and tickers that are not listed above."),
+            expected_output=("Comprehensive latest market data, stock performance metrics, and relevant news articles,"
+                             " summarized per researched ticker together with the sources used."
+                             " Output should be in the form of StockResearchFindingList object"),
+            agent=research_agent,
+            output_pydantic=StockResearchFindingList,
+            callback=functools.partial(self._cache_research_output, research_plan)
         )
 
-        # agent to get stock price at end of the day
-        self.stock_closing_price_analysis_agent= Agent(
-            role="Stock Price Agent",
-            goal="Fetch the stock closing price for the date {review_date} for the stock codes fetched from the database",
-            backstory=(" You are an expert in retrieving accurate stock price data."
-                       " Your goal is to fetch stock names or codes from the table 'stock_market_data_analysis' for the date {review_date}"
-                       " and get their closing prices for that date."
-                       " Use search tool to get the stock prices."
-                       " Use the `list_tables` to find available tables."
-                       " Use the `tables_schema` to understand the metadata for the tables."
-                       " Use the `execute_sql` to check your queries for correctness."
-                       " Use the `check_sql` to execute queries against the database."),
-            verbose=verbose_flag,
-            memory=True,
-            allow_delegation=False,
-            tools=[search_tool, execute_sql, check_sql, list_tables, tables_schema]
+        # define tasks for stock analysis agent
+        analysis_task = Task(
+            description=("Analyze the researched stock data and identify top {number} stocks to buy with detailed recommendations."
+                         " Also consider the cached research of tickers that did not need to be researched again:"
+                         "\n{cached_research}"),
+            expected_output=("A list of top {number} stocks along with stock code in the specified {market} to buy with buy price, "
+                             "target price for day and weekly trades, stop loss prices, analysis date time and rationale."
+                             "Analysis date should be the current date when the analysis is performed."
+                             "Analysis date should be in the format of YYYY-MM-DD"
+                             "Output should be in the form of list of StockAnalysisData objects"),
+            agent=analysis_agent,
+            output_json=StockAnalysisDataList
         )
 
-        self.stock_closing_price_task = Task(
-            description="Retrieve the closing stock prices for the given date {review_date} for all the stock codes fetched from database",
-            expected_output=("Update the day_end_price column for each stock code with the retrieved closing price."
-                            " Successful updation of closing prices for all stock codes for the given date."),
-            agent=self.stock_closing_price_analysis_agent
+        # define task for stock_data_storage_agent
+        storage_task = Task(
+            description="Store the analyzed stock data into the database for future reference.",
+            expected_output="Confirmation of successful data storage and list of stored stock data.",
+            agent=storage_agent
         )
+        return research_task, analysis_task, storage_task
 
+    def _cache_research_output(self, research_plan: Optional[ResearchCachePlan], task_output):
+        """
+        Cache the per ticker findings of the research task. The scan's plan supplies the market and the reused
+        tickers; without one only tickers with stale or no cached research are written.
+        :param research_plan: plan bound to the task when the scan was built
+        :param task_output:
+        :return:
+        """
+        payload = task_output.pydantic if task_output.pydantic is not None else task_output.json_dict
+        if payload is None:
+            logger.warning("Research task returned no structured findings, nothing to cache")
+            return
+        findings = payload.findings if hasattr(payload, "findings") else payload.get("findings", [])
+        findings = [finding.model_dump() if hasattr(finding, "model_dump") else finding for finding in findings]
+        cache_research_findings(database_client, [finding for finding in findings if isinstance(finding, dict)],
+                                research_plan)
 
     def get_closing_price(self, review_date: str):
         """
@@ -178,31 +244,82 @@ class CrewAiAgentsConfig:
         response = stock_price_crew.kickoff(inputs=inputs)
         return response
 
-    def run_stock_analysis(self,market: str, number: int):
+    def _build_stock_crew(self, research_plan: ResearchCachePlan, step_callback=None, task_callback=None) -> Crew:
         """
-        Run the stock analysis crew with given market and number of stocks to analyze.
-        :param market:
-        :param number:
+        Create a morning scan crew with its own agents and tasks. Crew copies step_callback onto agents and
+        task_callback onto tasks, so sharing them between runs would call an earlier run's callbacks.
+        The research plan is bound to the research task callback and cache tool, which crewAI may run in
+        threads of its own.
+        :param research_plan:
+        :param step_callback:
+        :param task_callback:
         :return:
         """
+        agents = self._create_scan_agents(research_plan)
         # create crew to orchestrate the agents and tasks
-        stock_crew = Crew(
-                agents=[self.stock_research_agent, self.stock_analysis_agent, self.stock_data_storage_agent],
-                tasks=[self.research_task, self.analysis_task, self.storage_task],
+        return Crew(
+                agents=list(agents),
+                tasks=list(self._create_scan_tasks(*agents, research_plan=research_plan)),
                 verbose=verbose_flag,
                 memory=True,
-                output_log_file=f"agent_logs/stock_crew_output_{datetime.now().strftime('%Y-%m-%d')}.log"
+                output_log_file=f"agent_logs/stock_crew_output_{datetime.now().strftime('%Y-%m-%d')}.log",
+                step_callback=step_callback,
+                task_callback=task_callback
         )
 
+    def run_stock_analysis(self,market: str, number: int):
+        """
+        Run the stock analysis crew with given market and number of stocks to analyze.
+        :param market:
+        :param number:
+        :return:
+        """
+        research_plan = ResearchCachePlan.build(database_client, market)
+        stock_crew = self._build_stock_crew(research_plan)
         inputs = {
             "market": market,
-            "number": number
+            "number": number,
+            **research_plan.inputs()
         }
         logger.info(f"Starting stock analysis crew with inputs:{inputs}")
 
         response = stock_crew.kickoff(inputs=inputs)
+        logger.info(research_plan.report())
         return response
 
+    def stream_stock_analysis(self, market: str, number: int,
+                              abort_event: Optional[threading.Event] = None) -> Iterator[CrewProgressEvent]:
+        """
+        Run the stock analysis crew in the background and yield progress events while it runs.
+        Recommendations are yielded as soon as the analysis task finishes, before they are stored.
+        Setting `abort_event` stops the crew at its next agent step.
+        :param market:
+        :param number:
+        :param abort_event:
+        :return:
+        """
+        research_plan = ResearchCachePlan.build(database_client, market)
+        stream = CrewProgressStream(abort_event=abort_event)
+        stock_crew = self._build_stock_crew(research_plan, step_callback=stream.step_callback,
+                                            task_callback=stream.task_callback)
+        stream.tasks = list(stock_crew.tasks)
+        inputs = {
+            "market": market,
+            "number": number,
+            **research_plan.inputs()
+        }
+        logger.info(f"Starting streamed stock analysis crew with inputs:{inputs}")
+
+        yield CrewProgressEvent(event_type="research_cache",
+                                message=f"Reusing cached research for {len(research_plan.stats.reused)} tickers, "
+                                        f"{len(research_plan.stale_tickers)} stale tickers to refresh",
+                                payload=research_plan.stats.model_dump())
+        yield from stream.run(lambda: stock_crew.kickoff(inputs=inputs))
+        report = research_plan.report()
+        logger.info(report)
+        yield CrewProgressEvent(event_type="research_cache", message=report,
+                                payload=research_plan.stats.model_dump())
+
     def get_stock_data_from_db(self, query: str):
         """
         Get stock data from database based on the given query.
@@ -239,7 +356,8 @@ if __name__ == '__main__':
 
     inputs = {
         "market": "Sweden",
-        "number": 5
+        "number": 5,
+        **ResearchCachePlan.build(database_client, "Sweden").inputs()
     }
 
     # crew = Crew(
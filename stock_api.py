@@ -0,0 +1,378 @@
+import argparse
+import base64
+import hashlib
+import io
+import json
+import logging
+import threading
+import time
+from datetime import date, datetime
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+from sqlalchemy import select, and_, or_
+
+from database_manager import DatabaseClient, StockMarketAnalysisData, add_write_listener
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:
+    # Arrow/Parquet responses are unavailable without pyarrow; JSON keeps working
+    pa = None
+    pq = None
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# cached responses also expire after this many seconds, to pick up writes that bypass the data version
+DEFAULT_CACHE_TTL = 30
+MAX_CACHE_ENTRIES = 10000
+
+CONTENT_TYPES = {
+    "json": "application/json",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+COLUMNS = ["stock_name", "stock_code", "market", "buy_price", "target_price_daily", "target_price_weekly",
+           "stop_loss", "analysis_date", "day_end_price"]
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def encode_cursor(analysis_date: date, stock_name: str) -> str:
+    raw = json.dumps([analysis_date.isoformat(), stock_name]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[date, str]:
+    try:
+        analysis_date, stock_name = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return date.fromisoformat(analysis_date), stock_name
+    except Exception:
+        raise ApiError(400, "Invalid cursor")
+
+
+def parse_date(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ApiError(400, f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
+class RecommendationRepository:
+    """
+    Read-only access to stock_market_data_analysis with keyset pagination on (analysis_date, stock_name).
+    """
+
+    def __init__(self, database_client: DatabaseClient):
+        self.database_client = database_client
+
+    def list_dates(self) -> List[date]:
+        return self.database_client.list_stock_data_analysis_dates()
+
+    def list_recommendations(self, analysis_date: Optional[date] = None, market: Optional[str] = None,
+                             stock_code: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE,
+                             cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """
+        Fetch one page of recommendations ordered by analysis date and stock name.
+        :return: rows of the page and the cursor of the next page, None on the last page
+        """
+        table = StockMarketAnalysisData
+        query = select(*[getattr(table, column) for column in COLUMNS])
+        if analysis_date is not None:
+            query = query.where(table.analysis_date == analysis_date)
+        if market is not None:
+            query = query.where(table.market == market)
+        if stock_code is not None:
+            query = query.where(table.stock_code == stock_code)
+        if cursor:
+            after_date, after_name = decode_cursor(cursor)
+            query = query.where(or_(table.analysis_date > after_date,
+                                    and_(table.analysis_date == after_date, table.stock_name > after_name)))
+        # fetch one extra row to know whether another page exists
+        query = query.order_by(table.analysis_date, table.stock_name).limit(limit + 1)
+
+        with self.database_client.engine.connect() as connection:
+            rows = [dict(row._mapping) for row in connection.execute(query)]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["analysis_date"], rows[-1]["stock_name"])
+        return rows, next_cursor
+
+
+class CachedResponse:
+    def __init__(self, body: bytes, content_type: str, headers: Dict[str, str], last_modified: Optional[float] = None):
+        self.body = body
+        self.content_type = content_type
+        self.headers = headers
+        # render time unless the cache knows the same body was served earlier
+        self.last_modified = time.time() if last_modified is None else last_modified
+        self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self.created = time.monotonic()
+        # stock data version read before the response was rendered
+        self.data_version: Optional[int] = None
+
+
+class ResponseCache:
+    """
+    In-process cache of rendered responses. Cleared whenever stock analysis data is written in this process.
+    Writes of other processes are detected by comparing the stock data version an entry was rendered at with
+    the current one, which costs one primary key lookup per request. Entries also expire after `ttl` seconds
+    to pick up writes that bypass the version, e.g. raw SQL.
+    Last-Modified is derived from the content: a re-rendered response keeps the timestamp of the last response
+    for the same request only if its ETag is unchanged, so it moves forward exactly when the data did.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_CACHE_TTL, data_version: Optional[Callable[[], int]] = None):
+        self.ttl = ttl
+        self._data_version = data_version
+        self._entries: Dict[tuple, CachedResponse] = {}
+        # (etag, last_modified) of the last response per request, kept across expiry and invalidation
+        self._validators: Dict[tuple, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def current_version(self) -> Optional[int]:
+        """
+        :return: current stock data version, None when the cache does not track it
+        """
+        return self._data_version() if self._data_version is not None else None
+
+    def get(self, key: tuple, data_version: Optional[int] = None) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (time.monotonic() - entry.created > self.ttl
+                                      or entry.data_version != data_version):
+                del self._entries[key]
+                return None
+            return entry
+
+    def put(self, key: tuple, entry: CachedResponse) -> CachedResponse:
+        with self._lock:
+            validator = self._validators.get(key)
+            if validator is not None and validator[0] == entry.etag:
+                entry.last_modified = validator[1]
+            if len(self._entries) >= MAX_CACHE_ENTRIES:
+                self._entries.clear()
+            if len(self._validators) >= MAX_CACHE_ENTRIES:
+                self._validators.clear()
+            self._entries[key] = entry
+            self._validators[key] = (entry.etag, entry.last_modified)
+        return entry
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+        logger.info("Response cache invalidated")
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value)} is not JSON serializable")
+
+
+def render(rows: List[dict], next_cursor: Optional[str], output_format: str) -> bytes:
+    if output_format == "json":
+        return json.dumps({"items": rows, "next_cursor": next_cursor}, default=_json_default).encode("utf-8")
+    if pa is None:
+        raise ApiError(406, "pyarrow is not installed, only JSON is available")
+    return _render_table(pa.Table.from_pylist(rows) if rows else pa.table({column: [] for column in COLUMNS}),
+                         output_format)
+
+
+def render_dates(dates: List[date], output_format: str) -> bytes:
+    if output_format == "json":
+        return json.dumps({"items": [d.isoformat() for d in dates]}).encode("utf-8")
+    if pa is None:
+        raise ApiError(406, "pyarrow is not installed, only JSON is available")
+    return _render_table(pa.table({"analysis_date": pa.array(dates, type=pa.date32())}), output_format)
+
+
+def _render_table(table, output_format: str) -> bytes:
+    sink = io.BytesIO()
+    if output_format == "arrow":
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        pq.write_table(table, sink)
+    return sink.getvalue()
+
+
+class StockApi:
+    """
+    Routes read-only requests to the repository and caches rendered responses.
+    """
+
+    def __init__(self, repository: RecommendationRepository, cache: ResponseCache):
+        self.repository = repository
+        self.cache = cache
+
+    def handle(self, path: str, params: Dict[str, str]) -> CachedResponse:
+        output_format = params.get("format", "json")
+        if output_format not in CONTENT_TYPES:
+            raise ApiError(400, f"Unsupported format '{output_format}'")
+
+        key = (path, tuple(sorted(params.items())))
+        # read before rendering, so a write during rendering leaves the entry outdated rather than the cache
+        data_version = self.cache.current_version()
+        cached = self.cache.get(key, data_version)
+        if cached is not None:
+            return cached
+
+        parts = [unquote(part) for part in path.strip("/").split("/") if part]
+        if parts == ["dates"]:
+            response = CachedResponse(render_dates(sorted(self.repository.list_dates()), output_format),
+                                      CONTENT_TYPES[output_format], {})
+        else:
+            filters = self._route(parts, params)
+            limit = self._limit(params)
+            rows, next_cursor = self.repository.list_recommendations(limit=limit, cursor=params.get("cursor"),
+                                                                     **filters)
+            headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+            response = CachedResponse(render(rows, next_cursor, output_format), CONTENT_TYPES[output_format],
+                                      headers)
+        response.data_version = data_version
+        return self.cache.put(key, response)
+
+    @staticmethod
+    def _route(parts: List[str], params: Dict[str, str]) -> dict:
+        filters = {
+            "analysis_date": parse_date(params["date"]) if "date" in params else None,
+            "market": params.get("market"),
+            "stock_code": params.get("stock_code"),
+        }
+        if parts == ["recommendations"]:
+            pass
+        elif len(parts) == 2 and parts[0] == "recommendations":
+            filters["analysis_date"] = parse_date(parts[1])
+        elif len(parts) == 3 and parts[0] == "markets" and parts[2] == "recommendations":
+            filters["market"] = parts[1]
+        elif len(parts) == 3 and parts[0] == "stocks" and parts[2] == "recommendations":
+            filters["stock_code"] = parts[1]
+        else:
+            raise ApiError(404, "Not found")
+        return filters
+
+    @staticmethod
+    def _limit(params: Dict[str, str]) -> int:
+        try:
+            limit = int(params.get("limit", DEFAULT_PAGE_SIZE))
+        except ValueError:
+            raise ApiError(400, "limit must be an integer")
+        return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def make_handler(api: StockApi):
+    class StockApiRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # buffer headers and body into a single send per response (flushed by handle_one_request) and disable
+        # Nagle, otherwise keep-alive clients stall ~40ms per request on the delayed ACK
+        wbufsize = -1
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            try:
+                response = api.handle(url.path, params)
+            except ApiError as e:
+                self._send_error(e.status, str(e))
+                return
+            except Exception as e:
+                logger.error(f"Failed to handle {self.path}: {e}")
+                self._send_error(500, "Internal server error")
+                return
+
+            if self._not_modified(response):
+                self.send_response(304)
+                self._send_cache_headers(response)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", response.content_type)
+            self.send_header("Content-Length", str(len(response.body)))
+            for name, value in response.headers.items():
+                self.send_header(name, value)
+            self._send_cache_headers(response)
+            self.end_headers()
+            self.wfile.write(response.body)
+
+        def _not_modified(self, response: CachedResponse) -> bool:
+            if_none_match = self.headers.get("If-None-Match")
+            if if_none_match is not None:
+                return response.etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match == "*"
+            if_modified_since = self.headers.get("If-Modified-Since")
+            if if_modified_since:
+                try:
+                    return int(response.last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+                except (TypeError, ValueError):
+                    return False
+            return False
+
+        def _send_cache_headers(self, response: CachedResponse):
+            self.send_header("ETag", response.etag)
+            self.send_header("Last-Modified", formatdate(response.last_modified, usegmt=True))
+            self.send_header("Cache-Control", "no-cache")
+
+        def _send_error(self, status: int, message: str):
+            body = json.dumps({"error": message}).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", CONTENT_TYPES["json"])
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return StockApiRequestHandler
+
+
+def create_server(host: str = "0.0.0.0", port: int = 8000, cache_ttl: float = DEFAULT_CACHE_TTL) -> ThreadingHTTPServer:
+    """
+    Create the read-only recommendations HTTP server.
+    :param host:
+    :param port:
+    :param cache_ttl: seconds a cached response stays valid without a write notification or data version change
+    :return:
+    """
+    database_client = DatabaseClient()
+    cache = ResponseCache(ttl=cache_ttl, data_version=database_client.get_data_version)
+    add_write_listener(cache.invalidate)
+    api = StockApi(RecommendationRepository(database_client), cache)
+    return ThreadingHTTPServer((host, port), make_handler(api))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Read-only HTTP API for stock recommendations")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_CACHE_TTL)
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, args.cache_ttl)
+    logger.info(f"Serving stock recommendations API on {args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
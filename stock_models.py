@@ -1,7 +1,7 @@
-from typing import List
+from typing import List, Optional, Dict, Any
 
 from pydantic import BaseModel, Field, validator
-from datetime import date
+from datetime import date, datetime
 
 
 # pydantic model to represent stock analysis data
@@ -29,4 +29,32 @@ class StockClosingPrice(BaseModel):
     analysis_date: date
 
 class StockClosingPriceList(BaseModel):
-    closing_prices: List[StockClosingPrice] = Field(description="List of stock closing prices")
\ No newline at end of file
+    closing_prices: List[StockClosingPrice] = Field(description="List of stock closing prices")
+
+# pydantic model to represent summarized research of a single ticker
+class StockResearchFinding(BaseModel):
+    stock_name: str
+    stock_code: str
+    market: str
+    summary: str = Field(description="Summary of fundamentals, recent performance and news relevant for trading")
+    sources: List[str] = Field(default_factory=list, description="URLs or references the summary is based on")
+
+class StockResearchFindingList(BaseModel):
+    findings: List[StockResearchFinding] = Field(description="List of researched tickers")
+
+# pydantic model to report how much of a morning scan was served from the research cache
+class ResearchCacheStats(BaseModel):
+    market: str
+    reused: List[str] = Field(default_factory=list, description="Fresh tickers taken from the cache")
+    refreshed: List[str] = Field(default_factory=list, description="Stale tickers researched again")
+    new: List[str] = Field(default_factory=list, description="Tickers researched for the first time")
+
+# pydantic model to represent a single progress event emitted while a crew is running
+class CrewProgressEvent(BaseModel):
+    event_type: str = Field(description="One of task_started, task_finished, tool_call, llm_chunk, recommendation, "
+                                        "research_cache, heartbeat, crew_finished, aborted, error")
+    message: str = ""
+    task_name: Optional[str] = None
+    agent_role: Optional[str] = None
+    payload: Optional[Dict[str, Any]] = None
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,212 @@
+import queue
+import threading
+import logging
+from typing import Callable, Iterator, List, Optional
+
+from stock_models import CrewProgressEvent
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# The CrewAI event bus moved between releases; task-started, tool-usage and LLM token events are only
+# available when one of these imports succeeds. Step/task callbacks work on every version.
+try:
+    from crewai.events import (crewai_event_bus, TaskStartedEvent, ToolUsageStartedEvent,
+                               LLMStreamChunkEvent)
+except Exception:
+    try:
+        from crewai.utilities.events import (crewai_event_bus, TaskStartedEvent, ToolUsageStartedEvent,
+                                             LLMStreamChunkEvent)
+    except Exception:
+        crewai_event_bus = None
+
+_DONE = object()
+
+# seconds without progress events after which the stream yields a heartbeat
+HEARTBEAT_INTERVAL = 1.0
+
+# progress streams currently attached to a running crew; the event bus handlers fan out to these
+_active_streams: List["CrewProgressStream"] = []
+_active_streams_lock = threading.Lock()
+
+
+class CrewRunAborted(Exception):
+    """Raised from inside a crew callback to stop a run the user aborted."""
+
+
+class CrewProgressStream:
+    """
+    Collects progress events from a crew running in a background thread and yields them to the caller.
+    Pass `step_callback` and `task_callback` to the Crew and iterate over the stream to consume events.
+    """
+
+    def __init__(self, tasks: Optional[list] = None, abort_event: Optional[threading.Event] = None):
+        self.tasks = list(tasks or [])
+        self.abort_event = abort_event or threading.Event()
+        self.result = None
+        self._events: queue.Queue = queue.Queue()
+
+    def emit(self, event_type: str, message: str = "", **kwargs):
+        self._events.put(CrewProgressEvent(event_type=event_type, message=message, **kwargs))
+
+    def abort(self):
+        self.abort_event.set()
+
+    def _check_aborted(self):
+        if self.abort_event.is_set():
+            raise CrewRunAborted("Crew run aborted by user")
+
+    def step_callback(self, step):
+        """
+        Called by CrewAI after every agent step. Tool calls are reported as events and an abort request
+        stops the run at the next step.
+        :param step: AgentAction, AgentFinish or ToolResult from the agent executor
+        :return:
+        """
+        self._check_aborted()
+        tool_name = getattr(step, "tool", None)
+        if tool_name and crewai_event_bus is None:
+            # the event bus reports tool calls itself when it is available
+            self.emit("tool_call", f"Using tool {tool_name}",
+                      payload={"tool": tool_name, "tool_input": str(getattr(step, "tool_input", ""))})
+
+    def task_callback(self, task_output):
+        """
+        Called by CrewAI when a task finishes. Structured stock recommendations are emitted one by one as
+        soon as the task producing them completes.
+        :param task_output: TaskOutput of the finished task
+        :return:
+        """
+        task_name = getattr(task_output, "name", None) or getattr(task_output, "description", None)
+        agent_role = getattr(task_output, "agent", None)
+        self.emit("task_finished", f"Finished task: {task_name}", task_name=task_name, agent_role=agent_role)
+
+        payload = getattr(task_output, "json_dict", None)
+        if payload is None and getattr(task_output, "pydantic", None) is not None:
+            pydantic_output = task_output.pydantic
+            payload = pydantic_output.model_dump() if hasattr(pydantic_output, "model_dump") else pydantic_output.dict()
+        if isinstance(payload, dict) and isinstance(payload.get("stocks"), list):
+            for stock in payload["stocks"]:
+                self.emit("recommendation", f"Recommendation: {stock.get('stock_name')}",
+                          task_name=task_name, agent_role=agent_role, payload=stock)
+        self._check_aborted()
+
+    def owns(self, source, event) -> bool:
+        """
+        Whether an event bus event belongs to this stream's crew. The bus is shared by every crew in the process,
+        so events are matched on the task or agent objects they carry (on the event or its source); events that
+        cannot be attributed are dropped rather than shown to the wrong run.
+        :param source: object that emitted the event, e.g. a ToolUsage or Task
+        :param event: event bus event
+        :return:
+        """
+        agents = [task.agent for task in self.tasks if getattr(task, "agent", None) is not None]
+        candidates = [source, getattr(event, "task", None), getattr(event, "from_task", None),
+                      getattr(source, "task", None), getattr(event, "agent", None), getattr(event, "from_agent", None),
+                      getattr(source, "agent", None)]
+        for candidate in candidates:
+            if candidate is None:
+                continue
+            if any(candidate is own for own in self.tasks + agents):
+                return True
+        # newer CrewAI versions only carry ids on some events
+        own_ids = {str(getattr(own, "id", "")) for own in self.tasks + agents} - {""}
+        event_ids = {str(getattr(event, name, "") or "") for name in ("task_id", "agent_id")} - {""}
+        return bool(own_ids & event_ids)
+
+    def run(self, kickoff: Callable[[], object],
+            heartbeat_interval: float = HEARTBEAT_INTERVAL) -> Iterator[CrewProgressEvent]:
+        """
+        Run `kickoff` in a background thread and yield progress events until it completes.
+        A `heartbeat` event is yielded whenever no other event arrived for `heartbeat_interval` seconds, so the
+        caller gets control back regularly during long LLM calls.
+        The crew is aborted when the caller stops iterating before the run ended, e.g. because a Streamlit rerun
+        abandoned the loop; nobody would receive its events anymore.
+        The kickoff result is available on `self.result` once iteration finishes.
+        :param kickoff: callable starting the crew
+        :param heartbeat_interval: seconds without events after which a heartbeat is yielded
+        :return:
+        """
+        def worker():
+            with _active_streams_lock:
+                _active_streams.append(self)
+            try:
+                self.result = kickoff()
+                self.emit("crew_finished", "Crew run completed")
+            except CrewRunAborted as e:
+                logger.info(f"Crew run aborted: {e}")
+                self.emit("aborted", str(e))
+            except Exception as e:
+                if self.abort_event.is_set():
+                    self.emit("aborted", "Crew run aborted by user")
+                else:
+                    logger.error(f"Crew run failed: {e}")
+                    self.emit("error", str(e))
+            finally:
+                with _active_streams_lock:
+                    _active_streams.remove(self)
+                self._events.put(_DONE)
+
+        threading.Thread(target=worker, daemon=True).start()
+        finished = False
+        try:
+            while True:
+                try:
+                    event = self._events.get(timeout=heartbeat_interval)
+                except queue.Empty:
+                    yield CrewProgressEvent(event_type="heartbeat")
+                    continue
+                if event is _DONE:
+                    finished = True
+                    break
+                yield event
+        finally:
+            if not finished:
+                logger.info("Progress stream abandoned before the crew finished, aborting the run")
+                self.abort()
+
+
+def _broadcast(handler: Callable[[CrewProgressStream], None]):
+    with _active_streams_lock:
+        streams = list(_active_streams)
+    for stream in streams:
+        try:
+            handler(stream)
+        except Exception as e:
+            logger.warning(f"Failed to publish progress event: {e}")
+
+
+if crewai_event_bus is not None:
+    @crewai_event_bus.on(TaskStartedEvent)
+    def _on_task_started(source, event):
+        task = getattr(event, "task", None)
+        task_name = getattr(task, "name", None) or getattr(task, "description", None)
+
+        def handler(stream):
+            if stream.owns(source, event):
+                stream.emit("task_started", f"Started task: {task_name}", task_name=task_name,
+                            agent_role=getattr(getattr(task, "agent", None), "role", None))
+        _broadcast(handler)
+
+    @crewai_event_bus.on(ToolUsageStartedEvent)
+    def _on_tool_usage_started(source, event):
+        tool_name = getattr(event, "tool_name", None)
+
+        def handler(stream):
+            if stream.owns(source, event):
+                stream.emit("tool_call", f"Using tool {tool_name}", agent_role=getattr(event, "agent_role", None),
+                            payload={"tool": tool_name, "tool_input": str(getattr(event, "tool_args", ""))})
+        _broadcast(handler)
+
+    @crewai_event_bus.on(LLMStreamChunkEvent)
+    def _on_llm_stream_chunk(source, event):
+        chunk = getattr(event, "chunk", "")
+
+        def handler(stream):
+            if stream.owns(source, event):
+                stream.emit("llm_chunk", chunk)
+        _broadcast(handler)
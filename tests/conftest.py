@@ -0,0 +1,40 @@
+from datetime import date
+
+import pytest
+
+import database_manager
+from database_manager import DatabaseClient, StockMarketAnalysisData, refresh_performance_rollups
+
+
+@pytest.fixture
+def database_client(tmp_path, monkeypatch):
+    monkeypatch.setattr(database_manager, "connection_string", f"sqlite:///{tmp_path / 'test_stock_data.db'}")
+    client = DatabaseClient()
+    yield client
+    client.engine.dispose()
+
+
+@pytest.fixture
+def make_recommendation():
+    """Factory of recommendation rows with daily/weekly targets and stop loss derived from the buy price."""
+    def make(stock_name: str, analysis_date: date, market: str = "Sweden", stock_code: str = None,
+             buy_price: float = 100.0, day_end_price: float = None) -> StockMarketAnalysisData:
+        return StockMarketAnalysisData(stock_name=stock_name, stock_code=stock_code or stock_name.upper(),
+                                       market=market, buy_price=buy_price, target_price_daily=buy_price * 1.02,
+                                       target_price_weekly=buy_price * 1.05, stop_loss=buy_price * 0.97,
+                                       analysis_date=analysis_date, day_end_price=day_end_price)
+    return make
+
+
+@pytest.fixture
+def add_recommendations(database_client):
+    """Store recommendation rows and refresh their rollups in one transaction, as store_stock_data does."""
+    def add(*rows: StockMarketAnalysisData) -> DatabaseClient:
+        def work(session):
+            session.add_all(rows)
+            session.flush()
+            refresh_performance_rollups(session, [(row.market, row.analysis_date) for row in rows])
+
+        database_client.write(work)
+        return database_client
+    return add
@@ -0,0 +1,113 @@
+import time
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+from backfill import FilePriceSource, PriceSource, RateLimitedPriceSource, backfill, find_missing_prices
+
+
+def write_prices(path, rows):
+    path.write_text("stock_code,date,close\n" + "".join(f"{code},{day},{close}\n" for code, day, close in rows))
+    return str(path)
+
+
+@pytest.fixture
+def recommendations(add_recommendations, make_recommendation):
+    return add_recommendations(
+        make_recommendation("volvo", date(2025, 1, 2)),
+        make_recommendation("abb", date(2025, 1, 2)),
+        make_recommendation("volvo", date(2025, 1, 3)),
+        make_recommendation("abb", date(2025, 1, 3), day_end_price=99.0),
+        make_recommendation("apple", date(2025, 1, 3), market="USA"),
+    )
+
+
+def run(database_client, source, tmp_path, **kwargs):
+    return backfill(database_client, source, date(2025, 1, 1), date(2025, 1, 31), batch_size=2,
+                    checkpoint_path=str(tmp_path / "checkpoint.json"), **kwargs)
+
+
+def test_price_source_is_abstract():
+    with pytest.raises(TypeError):
+        PriceSource()
+
+
+def test_find_missing_prices_filters_markets_and_written_prices(recommendations):
+    assert find_missing_prices(recommendations, date(2025, 1, 1), date(2025, 1, 31), ["Sweden"]) == [
+        (date(2025, 1, 2), "Sweden", "ABB"), (date(2025, 1, 2), "Sweden", "VOLVO"), (date(2025, 1, 3), "Sweden", "VOLVO")]
+
+
+def test_backfill_writes_prices_and_skips_known_missing_for_same_source(recommendations, tmp_path):
+    source = FilePriceSource(write_prices(tmp_path / "prices.csv", [
+        ("VOLVO", "2025-01-02", 101.0), ("VOLVO", "2025-01-03", 102.0), ("APPLE", "2025-01-03", 150.0)]))
+
+    stats = run(recommendations, source, tmp_path)
+    assert (stats["pending"], stats["fetched"], stats["missing"], stats["updated"]) == (4, 3, 1, 3)
+
+    again = run(recommendations, source, tmp_path)
+    assert (again["pending"], again["skipped"]) == (0, 1)
+    assert run(recommendations, source, tmp_path, retry_missing=True)["missing"] == 1
+
+
+def test_backfill_retries_missing_prices_with_a_new_source(recommendations, tmp_path):
+    run(recommendations, FilePriceSource(write_prices(tmp_path / "prices.csv", [("VOLVO", "2025-01-02", 101.0)])),
+        tmp_path)
+
+    # the same file updated with the prices that were missing is a different source
+    better = FilePriceSource(write_prices(tmp_path / "prices.csv", [
+        ("ABB", "2025-01-02", 98.0), ("VOLVO", "2025-01-03", 102.0), ("APPLE", "2025-01-03", 150.0)]))
+    stats = run(recommendations, better, tmp_path)
+
+    assert (stats["pending"], stats["skipped"], stats["updated"]) == (3, 0, 3)
+    assert find_missing_prices(recommendations, date(2025, 1, 1), date(2025, 1, 31)) == []
+
+
+def test_each_batch_is_written_with_one_update_and_no_read_per_price(recommendations, tmp_path):
+    source = FilePriceSource(write_prices(tmp_path / "prices.csv", [
+        ("VOLVO", "2025-01-02", 101.0), ("ABB", "2025-01-02", 98.0), ("VOLVO", "2025-01-03", 102.0),
+        ("APPLE", "2025-01-03", 150.0)]))
+    updates = []
+    statements = []
+
+    def capture(connection, cursor, statement, parameters, context, executemany):
+        if "stock_market_data_analysis" in statement:
+            statements.append(statement)
+        if statement.startswith("UPDATE stock_market_data_analysis"):
+            updates.append(len(parameters) if executemany else 1)
+
+    event.listen(recommendations.engine, "before_cursor_execute", capture)
+    try:
+        stats = backfill(recommendations, source, date(2025, 1, 1), date(2025, 1, 31), batch_size=10,
+                         checkpoint_path=str(tmp_path / "checkpoint.json"))
+    finally:
+        event.remove(recommendations.engine, "before_cursor_execute", capture)
+
+    assert stats["updated"] == 4
+    assert updates == [4]
+    # find the missing prices, one UPDATE, one read per refreshed (market, analysis_date) group; no read per price
+    assert len(statements) == 1 + 1 + 3
+
+
+def test_failed_fetches_are_retried(recommendations, tmp_path):
+    class FailingSource(PriceSource):
+        def get_closing_price(self, stock_code, market, trade_date):
+            raise ConnectionError("offline")
+
+    assert run(recommendations, FailingSource(), tmp_path)["failed"] == 4
+    assert run(recommendations, FailingSource(), tmp_path)["pending"] == 4
+
+
+def test_rate_limited_source_spaces_requests():
+    class ConstantSource(PriceSource):
+        def get_closing_price(self, stock_code, market, trade_date):
+            return 1.0
+
+    source = RateLimitedPriceSource(ConstantSource(), rate=20)
+    started = time.monotonic()
+    for _ in range(5):
+        assert source.get_closing_price("VOLVO", "Sweden", date(2025, 1, 2)) == 1.0
+
+    # the first request is immediate, the following four wait 1/20 s each
+    assert time.monotonic() - started >= 0.19
+    assert source.name == ConstantSource().name
@@ -0,0 +1,134 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import event, insert
+
+import database_manager
+from database_manager import DatabaseClient, StockMarketAnalysisData, create_sqlite_engine
+from sqlite_maintenance import migrate
+
+DAY = date(2025, 1, 2)
+
+
+@pytest.fixture
+def recommendations(add_recommendations, make_recommendation):
+    return add_recommendations(*[make_recommendation(name, DAY) for name in ("volvo", "abb", "saab", "sinch")],
+                               make_recommendation("apple", DAY, market="USA"))
+
+
+def rollup(database_client, market="Sweden"):
+    rollups = database_client.list_performance_rollups(market=market)
+    assert len(rollups) == 1
+    return rollups[0]
+
+
+def test_unpriced_recommendations_are_counted_without_rates(recommendations):
+    summary = rollup(recommendations)
+    assert summary["recommendation_count"] == 4
+    assert summary["priced_count"] == 0
+    assert summary["hit_daily_target_rate"] is None
+    assert summary["median_return"] is None
+
+
+def test_day_end_prices_update_only_the_touched_group(recommendations):
+    updated = recommendations.update_day_end_prices([
+        {"stock_code": "VOLVO", "analysis_date": "2025-01-02", "day_end_price": 103.0},  # hit daily target
+        {"stock_code": "ABB", "analysis_date": "2025-01-02", "day_end_price": 96.0},     # stopped out
+        {"stock_code": "SAAB", "analysis_date": "2025-01-02", "day_end_price": 101.0},
+    ])
+
+    assert updated == 3
+    summary = rollup(recommendations)
+    assert summary["priced_count"] == 3
+    assert summary["hit_daily_target_count"] == 1
+    assert summary["stop_out_count"] == 1
+    assert summary["hit_daily_target_rate"] == pytest.approx(1 / 3)
+    assert summary["mean_return"] == pytest.approx(0.0)
+    assert summary["median_return"] == pytest.approx(0.01)
+    assert rollup(recommendations, "USA")["priced_count"] == 0
+
+
+def test_closing_prices_match_on_stock_code_not_name(recommendations):
+    updated = recommendations.update_day_end_prices([
+        {"stock_name": "Volvo AB", "stock_code": "VOLVO", "analysis_date": DAY, "day_end_price": 103.0},
+        {"stock_name": "volvo", "stock_code": "UNKNOWN", "analysis_date": DAY, "day_end_price": 50.0},
+    ])
+
+    assert updated == 1
+    assert rollup(recommendations)["mean_return"] == pytest.approx(0.03)
+
+
+def test_rebuild_matches_incremental_rollups(recommendations):
+    recommendations.update_day_end_prices([{"stock_code": "SINCH", "analysis_date": DAY, "day_end_price": 110.0}])
+    incremental = rollup(recommendations)
+
+    assert recommendations.rebuild_performance_rollups() == 2
+    rebuilt = rollup(recommendations)
+    for column in ("recommendation_count", "priced_count", "hit_daily_target_count", "stop_out_count",
+                   "mean_return", "median_return"):
+        assert rebuilt[column] == incremental[column]
+
+
+def test_price_updates_and_rollup_refreshes_seek_on_composite_indexes(recommendations):
+    statements = []
+
+    def capture(connection, cursor, statement, parameters, context, executemany):
+        if "stock_market_data_analysis" in statement:
+            statements.append((statement, parameters[0] if executemany else parameters))
+
+    event.listen(recommendations.engine, "before_cursor_execute", capture)
+    try:
+        # no market, as sent by StockClosingPriceStorageTool
+        recommendations.update_day_end_prices([{"stock_code": "VOLVO", "analysis_date": DAY, "day_end_price": 103.0}])
+    finally:
+        event.remove(recommendations.engine, "before_cursor_execute", capture)
+
+    assert statements
+    with recommendations.engine.connect() as connection:
+        for statement, parameters in statements:
+            plan = " ".join(row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}",
+                                                                          parameters))
+            # the index narrows the rows down to one ticker or one market on that day
+            assert "SCAN stock_market_data_analysis" not in plan, statement
+            assert "AND analysis_date=?" in plan, plan
+
+
+def old_database(url, *rows):
+    # recommendations stored before the rollup table existed, with prices written by raw SQL
+    engine = create_sqlite_engine(url)
+    StockMarketAnalysisData.__table__.create(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(insert(StockMarketAnalysisData.__table__), [
+            {column.name: getattr(row, column.name) for column in StockMarketAnalysisData.__table__.columns}
+            for row in rows])
+    engine.dispose()
+
+
+def test_rollups_are_built_for_existing_history(tmp_path, monkeypatch, make_recommendation):
+    url = f"sqlite:///{tmp_path / 'old.db'}"
+    old_database(url, make_recommendation("volvo", DAY, day_end_price=103.0),
+                 make_recommendation("abb", DAY))
+    monkeypatch.setattr(database_manager, "connection_string", url)
+
+    database_client = DatabaseClient()
+
+    summary = rollup(database_client)
+    assert (summary["recommendation_count"], summary["priced_count"], summary["hit_daily_target_count"]) == (2, 1, 1)
+    database_client.engine.dispose()
+
+
+def test_migrate_builds_rollups_of_copied_rows(tmp_path, make_recommendation):
+    source_url = f"sqlite:///{tmp_path / 'source.db'}"
+    old_database(source_url, make_recommendation("volvo", DAY, day_end_price=96.0),
+                 make_recommendation("apple", DAY, market="USA"))
+    url = f"sqlite:///{tmp_path / 'target.db'}"
+
+    assert migrate(url, source_url) == 2
+
+    engine = create_sqlite_engine(url)
+    with engine.connect() as connection:
+        rollups = {row.market: row for row in connection.exec_driver_sql(
+            "select market, recommendation_count, stop_out_count from stock_performance_rollup")}
+    engine.dispose()
+    assert rollups["Sweden"].stop_out_count == 1
+    assert rollups["USA"].recommendation_count == 1
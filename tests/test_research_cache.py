@@ -0,0 +1,66 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from research_cache import ResearchCachePlan, cache_research_findings
+
+
+def finding(stock_code: str, market: str = "Sweden", summary: str = "summary") -> dict:
+    return {"stock_code": stock_code, "stock_name": stock_code.title(), "market": market, "summary": summary,
+            "sources": ["https://example.com"]}
+
+
+@pytest.fixture
+def cached(database_client):
+    database_client.upsert_research_findings([finding("VOLVO", summary="volvo summary"), finding("ABB")])
+    return database_client
+
+
+def test_plan_splits_fresh_and_stale_tickers(cached):
+    plan = ResearchCachePlan.build(cached, "Sweden")
+    assert plan.stats.reused == ["ABB", "VOLVO"]
+    assert plan.stale_tickers == set()
+
+    later = ResearchCachePlan.build(cached, "Sweden", max_age=timedelta(hours=24),
+                                    now=datetime.utcnow() + timedelta(hours=25))
+    assert later.stats.reused == []
+    assert later.stale_tickers == {"ABB", "VOLVO"}
+    assert later.inputs() == {"cached_research": "None", "stale_tickers": "ABB, VOLVO"}
+
+
+def test_plan_inputs_include_fresh_summaries(cached):
+    inputs = ResearchCachePlan.build(cached, "Sweden").inputs()
+    assert "Volvo (VOLVO)" in inputs["cached_research"]
+    assert "volvo summary" in inputs["cached_research"]
+    assert inputs["stale_tickers"] == "None"
+
+
+def test_plan_overrides_market_keeps_reused_and_counts(cached):
+    plan = ResearchCachePlan(market="Sweden", fresh=[{"stock_code": "VOLVO"}], stale=[{"stock_code": "ABB"}])
+
+    written = cache_research_findings(cached, [finding("VOLVO", summary="rewritten"),
+                                               finding("ABB", market="SE", summary="refreshed"),
+                                               finding("SAAB", market="sweden")], plan)
+    # the tool and the task callback may both report the same ticker, from threads crewAI starts itself
+    worker = threading.Thread(target=cache_research_findings, args=(cached, [finding("SAAB")], plan))
+    worker.start()
+    worker.join()
+
+    assert written == 2
+    entries = {entry["stock_code"]: entry for entry in cached.list_research_findings("Sweden")}
+    assert entries["VOLVO"]["summary"] == "volvo summary"
+    assert entries["ABB"]["summary"] == "refreshed"
+    assert "SAAB" in entries
+    assert cached.list_research_findings("SE") == []
+    assert (plan.stats.reused, plan.stats.refreshed, plan.stats.new) == (["VOLVO"], ["ABB"], ["SAAB"])
+    assert plan.report() == "Research cache for Sweden: reused 1, refreshed 1, new 1 tickers"
+
+
+def test_without_plan_fresh_tickers_are_not_overwritten(cached):
+    written = cache_research_findings(cached, [finding("VOLVO", summary="rewritten"), finding("SAAB")])
+
+    assert written == 1
+    entries = {entry["stock_code"]: entry for entry in cached.list_research_findings("Sweden")}
+    assert entries["VOLVO"]["summary"] == "volvo summary"
+    assert "SAAB" in entries
@@ -0,0 +1,80 @@
+import threading
+from datetime import date
+
+import pytest
+from sqlalchemy import func, inspect, select, text
+
+from database_manager import Base, SQLiteWriteQueue, StockMarketAnalysisData, create_sqlite_engine
+from sqlite_maintenance import migrate
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_sqlite_engine(f"sqlite:///{tmp_path / 'embedded.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+def count_rows(engine) -> int:
+    with engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(StockMarketAnalysisData)).scalar()
+
+
+def test_pragmas_are_applied_to_every_connection(engine):
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+
+
+def test_write_queue_serializes_concurrent_writers(engine, make_recommendation):
+    write_queue = SQLiteWriteQueue(engine)
+
+    def writer(index: int):
+        for day in range(1, 11):
+            write_queue.submit(lambda session: session.add(
+                make_recommendation(f"stock-{index}", date(2025, 1, day)))).result()
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    write_queue.close()
+
+    assert count_rows(engine) == 80
+
+
+def test_write_queue_rolls_back_failed_work(engine, make_recommendation):
+    write_queue = SQLiteWriteQueue(engine)
+
+    def failing(session):
+        session.add(make_recommendation("volvo", date(2025, 1, 2)))
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        write_queue.submit(failing).result()
+    # the writer thread keeps serving after a failure
+    write_queue.submit(lambda session: session.add(make_recommendation("abb", date(2025, 1, 2)))).result()
+    write_queue.close()
+
+    assert count_rows(engine) == 1
+
+
+def test_migrate_adds_missing_indexes_to_existing_tables(tmp_path):
+    url = f"sqlite:///{tmp_path / 'old.db'}"
+    engine = create_sqlite_engine(url)
+    # table as created before the pagination index existed
+    StockMarketAnalysisData.__table__.create(bind=engine)
+    with engine.begin() as connection:
+        for index in inspect(connection).get_indexes(StockMarketAnalysisData.__tablename__):
+            connection.execute(text(f"DROP INDEX {index['name']}"))
+    engine.dispose()
+
+    migrate(url)
+
+    engine = create_sqlite_engine(url)
+    indexes = {index["name"] for index in inspect(engine).get_indexes(StockMarketAnalysisData.__tablename__)}
+    engine.dispose()
+    assert {index.name for index in StockMarketAnalysisData.__table__.indexes} <= indexes
@@ -0,0 +1,149 @@
+import http.client
+import json
+import threading
+import time
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+from stock_api import (CONTENT_TYPES, ApiError, RecommendationRepository, ResponseCache, StockApi,
+                       ThreadingHTTPServer, decode_cursor, encode_cursor, make_handler)
+
+
+@pytest.fixture
+def api(add_recommendations, make_recommendation):
+    database_client = add_recommendations(
+        make_recommendation("volvo", date(2025, 1, 2)),
+        make_recommendation("abb", date(2025, 1, 2)),
+        make_recommendation("apple", date(2025, 1, 2), market="USA"),
+        make_recommendation("ericsson", date(2025, 1, 3)),
+    )
+    return StockApi(RecommendationRepository(database_client), ResponseCache())
+
+
+def items(response):
+    return json.loads(response.body)
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(date(2025, 1, 2), "volvo")) == (date(2025, 1, 2), "volvo")
+    with pytest.raises(ApiError):
+        decode_cursor("not-a-cursor")
+
+
+def test_keyset_pagination_walks_all_rows_in_order(api):
+    names = []
+    params = {"limit": "2"}
+    while True:
+        page = items(api.handle("/recommendations", params))
+        names += [row["stock_name"] for row in page["items"]]
+        if page["next_cursor"] is None:
+            break
+        params = {"limit": "2", "cursor": page["next_cursor"]}
+
+    assert names == ["abb", "apple", "volvo", "ericsson"]
+
+
+def test_routes_filter_by_date_market_and_stock_code(api):
+    assert [row["stock_name"] for row in items(api.handle("/recommendations/2025-01-03", {}))["items"]] == ["ericsson"]
+    assert [row["stock_name"] for row in items(api.handle("/markets/USA/recommendations", {}))["items"]] == ["apple"]
+    assert [row["stock_name"] for row in items(api.handle("/stocks/VOLVO/recommendations", {}))["items"]] == ["volvo"]
+    assert items(api.handle("/dates", {}))["items"] == ["2025-01-02", "2025-01-03"]
+
+
+@pytest.mark.parametrize("path, params, status", [
+    ("/unknown", {}, 404),
+    ("/recommendations/not-a-date", {}, 400),
+    ("/recommendations", {"format": "xml"}, 400),
+    ("/recommendations", {"limit": "ten"}, 400),
+])
+def test_invalid_requests(api, path, params, status):
+    with pytest.raises(ApiError) as error:
+        api.handle(path, params)
+    assert error.value.status == status
+
+
+def test_last_modified_moves_only_when_content_changes(api, database_client, make_recommendation):
+    api.cache.ttl = 0
+    first = api.handle("/recommendations/2025-01-02", {})
+    time.sleep(1.1)
+    unchanged = api.handle("/recommendations/2025-01-02", {})
+    assert unchanged.etag == first.etag
+    assert unchanged.last_modified == first.last_modified
+
+    # written by another process: no invalidation reaches this cache
+    database_client.write(lambda session: session.add(make_recommendation("saab", date(2025, 1, 2))))
+    changed = api.handle("/recommendations/2025-01-02", {})
+    assert changed.etag != first.etag
+    assert changed.last_modified > first.last_modified
+
+
+def test_keep_alive_connection_serves_requests_without_delayed_ack_stall(api):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(api))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+    try:
+        started = time.perf_counter()
+        for _ in range(20):
+            connection.request("GET", "/recommendations?limit=2")
+            response = connection.getresponse()
+            assert response.status == 200
+            assert len(json.loads(response.read())["items"]) == 2
+        etag = response.getheader("ETag")
+        connection.request("GET", "/recommendations?limit=2", headers={"If-None-Match": etag})
+        response = connection.getresponse()
+        assert response.status == 304
+        assert response.read() == b""
+        # separate unbuffered header and body sends cost ~40ms per request on one connection
+        assert time.perf_counter() - started < 0.5
+    finally:
+        connection.close()
+        server.shutdown()
+        server.server_close()
+
+
+def test_keyset_page_query_uses_the_pagination_index(api, database_client):
+    statements = []
+
+    def capture(connection, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(database_client.engine, "before_cursor_execute", capture)
+    try:
+        api.repository.list_recommendations(limit=2, cursor=encode_cursor(date(2025, 1, 2), "abb"))
+    finally:
+        event.remove(database_client.engine, "before_cursor_execute", capture)
+
+    statement, parameters = statements[-1]
+    with database_client.engine.connect() as connection:
+        plan = " ".join(row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters))
+    assert "ix_stock_market_data_analysis_date_name" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_writes_of_other_processes_invalidate_cached_responses(api, database_client):
+    # no write listener is registered, as for a write made by the Streamlit or crew process
+    api.cache = ResponseCache(ttl=3600, data_version=database_client.get_data_version)
+    first = api.handle("/recommendations/2025-01-02", {})
+    assert api.handle("/recommendations/2025-01-02", {}) is first
+
+    database_client.update_day_end_prices([{"stock_code": "VOLVO", "analysis_date": date(2025, 1, 2),
+                                            "day_end_price": 101.0}])
+
+    changed = api.handle("/recommendations/2025-01-02", {})
+    assert changed is not first
+    assert {row["stock_name"]: row["day_end_price"] for row in items(changed)["items"]}["volvo"] == 101.0
+
+
+@pytest.mark.parametrize("output_format", ["arrow", "parquet"])
+def test_dates_are_rendered_in_the_requested_format(api, output_format):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    response = api.handle("/dates", {"format": output_format})
+
+    assert response.content_type == CONTENT_TYPES[output_format]
+    table = pa.ipc.open_stream(response.body).read_all() if output_format == "arrow" \
+        else pq.read_table(pa.BufferReader(response.body))
+    assert table.column("analysis_date").to_pylist() == [date(2025, 1, 2), date(2025, 1, 3)]
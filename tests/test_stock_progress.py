@@ -0,0 +1,63 @@
+import threading
+from types import SimpleNamespace
+
+from stock_progress import CrewProgressStream
+
+
+def make_task(role: str):
+    return SimpleNamespace(agent=SimpleNamespace(role=role), description=f"{role} task")
+
+
+def test_owns_matches_only_own_tasks_and_agents():
+    task = make_task("Stock Research Agent")
+    other_task = make_task("Stock Research Agent")
+    stream = CrewProgressStream(tasks=[task])
+
+    assert stream.owns(task, SimpleNamespace())
+    assert stream.owns(SimpleNamespace(agent=task.agent), SimpleNamespace())
+    assert stream.owns(None, SimpleNamespace(from_agent=task.agent))
+    # same role in another session's crew does not count
+    assert not stream.owns(other_task, SimpleNamespace(agent_role="Stock Research Agent"))
+    assert not stream.owns(None, SimpleNamespace(chunk="token"))
+
+
+def test_task_callback_emits_recommendations_and_run_finishes():
+    stream = CrewProgressStream()
+    task_output = SimpleNamespace(name="analysis", agent="Stock Analysis Agent", pydantic=None,
+                                  json_dict={"stocks": [{"stock_name": "Volvo"}, {"stock_name": "Saab"}]})
+
+    events = list(stream.run(lambda: stream.task_callback(task_output)))
+
+    assert [event.event_type for event in events] == ["task_finished", "recommendation", "recommendation",
+                                                      "crew_finished"]
+    assert events[1].payload == {"stock_name": "Volvo"}
+
+
+def test_abort_stops_run_at_next_step():
+    abort_event = threading.Event()
+    abort_event.set()
+    stream = CrewProgressStream(abort_event=abort_event)
+
+    events = list(stream.run(lambda: stream.step_callback(SimpleNamespace())))
+
+    assert [event.event_type for event in events] == ["aborted"]
+
+
+def test_heartbeat_while_waiting_and_abort_when_abandoned():
+    stream = CrewProgressStream()
+    started = threading.Event()
+
+    def kickoff():
+        started.set()
+        while True:
+            stream.step_callback(SimpleNamespace())
+            stream.abort_event.wait(0.01)
+
+    events = stream.run(kickoff, heartbeat_interval=0.01)
+    assert next(events).event_type == "heartbeat"
+    assert started.is_set()
+
+    # a Streamlit rerun drops the generator without reaching the end of the run
+    events.close()
+
+    assert stream.abort_event.is_set()